@@ -1,43 +1,60 @@
 ﻿from __future__ import annotations
 
+import argparse
+import io
 import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from result_cache import ResultCache  # repo-root helper shared by the pipelines
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
 RAW_PATH = os.path.join(DATA_DIR, "tickets_raw.csv")
 
-def parse_dt(series: pd.Series) -> pd.Series:
-    return pd.to_datetime(series, errors="coerce")
+TS_COLS = ["created_at", "intake_at", "triage_at", "work_at", "resolved_at"]
+STAGE_COLS = ["intake_hours", "triage_hours", "work_hours", "review_hours"]
 
-def hours_between(a: pd.Series, b: pd.Series) -> pd.Series:
-    return (b - a).dt.total_seconds() / 3600.0
+# Group KPI tables: group column -> output file
+GROUP_KPIS = {
+    "priority": "kpi_by_priority.csv",
+    "category": "kpi_by_category.csv",
+    "owner_team": "kpi_by_owner.csv",
+}
 
-def main() -> None:
-    if not os.path.exists(RAW_PATH):
-        raise FileNotFoundError(f"Missing raw file: {RAW_PATH}. Run generate_data.py first.")
+OUTPUT_FILES = ["tickets_clean.csv", "tickets_rejected.csv", "kpi_overall.csv", *GROUP_KPIS.values(), "kpi_bottlenecks.csv"]
 
-    df = pd.read_csv(RAW_PATH)
+# Parallel mode: shard order columns, dropped before export
+ORDER_COLS = ["_shard", "_line"]
 
-    # Parse timestamps
-    for c in ["created_at", "intake_at", "triage_at", "work_at", "resolved_at"]:
-        df[c] = parse_dt(df[c])
+def parse_dt(series: pd.Series) -> pd.Series:
+    # Fixed format rather than inferring one from the first row: parallel shards
+    # each have a different first row, and mixed precision must parse the same
+    return pd.to_datetime(series, format="ISO8601", errors="coerce")
 
-    # Drop exact duplicate rows
-    before = len(df)
-    df = df.drop_duplicates()
-    removed_dups = before - len(df)
+def hours_between(a: pd.Series, b: pd.Series) -> pd.Series:
+    return (b - a).dt.total_seconds() / 3600.0
 
+def monotonic_ok(row) -> bool:
+    # Validate timeline monotonicity (created <= intake <= triage <= work <= resolved)
+    ts = [row["created_at"], row["intake_at"], row["triage_at"], row["work_at"], row["resolved_at"]]
+    if any(pd.isna(x) for x in ts):
+        return False
+    return ts == sorted(ts)
+
+def validate(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split de-duplicated tickets into (clean, rejected) and add metric columns
+    to clean. Needs every row of a ticket_id, which hash partitioning keeps together.
+    """
     # Flag duplicate ticket IDs (data quality signal)
     df["is_duplicate_ticket_id"] = df.duplicated(subset=["ticket_id"], keep=False)
 
-    # Validate timeline monotonicity (created <= intake <= triage <= work <= resolved)
-    def monotonic_ok(row) -> bool:
-        ts = [row["created_at"], row["intake_at"], row["triage_at"], row["work_at"], row["resolved_at"]]
-        if any(pd.isna(x) for x in ts):
-            return False
-        return ts == sorted(ts)
-
-    df["is_valid_timeline"] = df.apply(monotonic_ok, axis=1)
+    df["is_valid_timeline"] = df.apply(monotonic_ok, axis=1) if len(df) else pd.Series(dtype=bool)
 
     rejected = df.loc[~df["is_valid_timeline"]].copy()
     clean = df.loc[df["is_valid_timeline"]].copy()
@@ -53,23 +70,13 @@ def main() -> None:
     clean["sla_breached"] = clean["cycle_time_hours"] > clean["sla_target_hours"]
 
     # Bottleneck stage (which stage took longest)
-    stage_cols = ["intake_hours", "triage_hours", "work_hours", "review_hours"]
-    clean["bottleneck_stage"] = clean[stage_cols].idxmax(axis=1).str.replace("_hours", "", regex=False)
+    clean["bottleneck_stage"] = (clean[STAGE_COLS].idxmax(axis=1).str.replace("_hours", "", regex=False)
+                                 if len(clean) else pd.Series(dtype=object))
 
-    # KPI tables
-    kpi_overall = pd.DataFrame([{
-        "rows_raw": int(before),
-        "rows_after_drop_duplicates": int(len(df)),
-        "duplicate_rows_removed": int(removed_dups),
-        "rows_valid_timeline": int(len(clean)),
-        "rows_rejected_invalid_timeline": int(len(rejected)),
-        "pct_valid": float(len(clean) / max(len(df), 1)),
-        "avg_cycle_time_hours": float(clean["cycle_time_hours"].mean()),
-        "median_cycle_time_hours": float(clean["cycle_time_hours"].median()),
-        "sla_breach_rate": float(clean["sla_breached"].mean()),
-    }])
+    return clean, rejected
 
-    by_priority = (clean.groupby("priority", as_index=False)
+def group_kpi(clean: pd.DataFrame, key: str) -> pd.DataFrame:
+    return (clean.groupby(key, as_index=False)
         .agg(
             tickets=("ticket_id", "count"),
             avg_cycle_time_hours=("cycle_time_hours", "mean"),
@@ -78,49 +85,267 @@ def main() -> None:
         .sort_values(["sla_breach_rate", "avg_cycle_time_hours"], ascending=False)
     )
 
-    by_category = (clean.groupby("category", as_index=False)
+def bottleneck_kpi(clean: pd.DataFrame) -> pd.DataFrame:
+    return (clean.groupby("bottleneck_stage", as_index=False)
         .agg(
             tickets=("ticket_id", "count"),
             avg_cycle_time_hours=("cycle_time_hours", "mean"),
-            sla_breach_rate=("sla_breached", "mean"),
         )
-        .sort_values(["sla_breach_rate", "avg_cycle_time_hours"], ascending=False)
+        .sort_values("tickets", ascending=False)
     )
 
-    by_owner = (clean.groupby("owner_team", as_index=False)
-        .agg(
-            tickets=("ticket_id", "count"),
-            avg_cycle_time_hours=("cycle_time_hours", "mean"),
-            sla_breach_rate=("sla_breached", "mean"),
-        )
-        .sort_values(["sla_breach_rate", "avg_cycle_time_hours"], ascending=False)
-    )
+def overall_kpi(rows_raw: int, rows_dedup: int, rows_clean: int, rows_rejected: int,
+                avg_cycle: float, median_cycle: float, breach_rate: float) -> pd.DataFrame:
+    return pd.DataFrame([{
+        "rows_raw": int(rows_raw),
+        "rows_after_drop_duplicates": int(rows_dedup),
+        "duplicate_rows_removed": int(rows_raw - rows_dedup),
+        "rows_valid_timeline": int(rows_clean),
+        "rows_rejected_invalid_timeline": int(rows_rejected),
+        "pct_valid": float(rows_clean / max(rows_dedup, 1)),
+        "avg_cycle_time_hours": float(avg_cycle),
+        "median_cycle_time_hours": float(median_cycle),
+        "sla_breach_rate": float(breach_rate),
+    }])
 
-    bottlenecks = (clean.groupby("bottleneck_stage", as_index=False)
-        .agg(
-            tickets=("ticket_id", "count"),
-            avg_cycle_time_hours=("cycle_time_hours", "mean"),
-        )
-        .sort_values("tickets", ascending=False)
-    )
+# -------------------------
+# Parallel mode
+# -------------------------
+def shard_ranges(path: str, n: int) -> tuple[list[str], list[tuple[int, int]]]:
+    """Header columns and ~equal byte ranges of the data rows, cut at line boundaries."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        data_start = f.tell()
+        cuts = [data_start]
+        for i in range(1, n):
+            f.seek(max(data_start + (size - data_start) * i // n - 1, cuts[-1]))
+            f.readline()
+            cuts.append(min(f.tell(), size))
+        cuts.append(size)
+    names = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+    ranges = [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+    return names, ranges
 
-    # Export outputs
-    os.makedirs(DATA_DIR, exist_ok=True)
+def bucket_of(ticket_id: pd.Series, n: int) -> np.ndarray:
+    """
+    Bucket on a key that does not depend on the dtype a shard inferred: 11,
+    11.0 and "11" all hash as "11.0". Numeric-looking IDs go through float,
+    other values through their text. This may put unequal IDs in one bucket,
+    which is harmless. It never splits values a single read would call equal.
+    """
+    num = pd.to_numeric(ticket_id, errors="coerce").astype("float64")
+    keys = ticket_id.astype(object).map(str).where(num.isna(), num.map(repr))
+    return (pd.util.hash_array(keys.to_numpy(dtype=object)) % np.uint64(n)).astype(np.intp)
 
+def _parse_shard(path: str, start: int, end: int, names: list[str], shard: int, n_buckets: int, tmp_dir: str) -> dict:
+    """Phase 1: parse one byte range and hash-partition its rows on ticket_id."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    df = pd.read_csv(io.BytesIO(data), header=None, names=names)
+    for c in TS_COLS:
+        df[c] = parse_dt(df[c])
+    df["_shard"] = shard
+    df["_line"] = np.arange(len(df))
+
+    buckets = bucket_of(df["ticket_id"], n_buckets)
+    for b in range(n_buckets):
+        df.loc[buckets == b].to_pickle(os.path.join(tmp_dir, f"part_{shard:04d}_{b:04d}.pkl"))
+    return {"rows": len(df), "dtypes": df.dtypes.to_dict()}
+
+def _partial_agg(clean: pd.DataFrame, key: str) -> pd.DataFrame:
+    g = clean.groupby(key)
+    return pd.DataFrame({
+        "tickets": g["ticket_id"].count(),
+        "rows": g.size(),
+        "cycle_sum": g["cycle_time_hours"].sum(),
+        "cycle_n": g["cycle_time_hours"].count(),
+        "breached": g["sla_breached"].sum(),
+    })
+
+def _process_bucket(bucket: int, n_shards: int, dtypes: dict, tmp_dir: str) -> dict:
+    """Phase 2: global de-dup + validation for one ticket_id bucket, then pre-aggregate."""
+    parts = [pd.read_pickle(os.path.join(tmp_dir, f"part_{s:04d}_{bucket:04d}.pkl")) for s in range(n_shards)]
+    df = pd.concat(parts, ignore_index=True).astype(dtypes).sort_values(ORDER_COLS, kind="stable")
+
+    data_cols = [c for c in df.columns if c not in ORDER_COLS]
+    df = df.loc[~df.duplicated(subset=data_cols)]
+    rows_dedup = len(df)
+
+    clean, rejected = validate(df)
+    clean = clean.drop(columns=ORDER_COLS)
+    rejected = rejected.drop(columns=ORDER_COLS)
+
+    clean_path = os.path.join(tmp_dir, f"clean_{bucket:04d}.csv")
+    rejected_path = os.path.join(tmp_dir, f"rejected_{bucket:04d}.csv")
+    clean.to_csv(clean_path, index=False, header=False)
+    rejected.to_csv(rejected_path, index=False, header=False)
+
+    return {
+        "rows_dedup": rows_dedup,
+        "rows_clean": len(clean),
+        "rows_rejected": len(rejected),
+        "clean_path": clean_path,
+        "rejected_path": rejected_path,
+        "clean_columns": list(clean.columns),
+        "rejected_columns": list(rejected.columns),
+        "cycle": clean["cycle_time_hours"].to_numpy(),
+        "breached": int(clean["sla_breached"].sum()),
+        "groups": {key: _partial_agg(clean, key) for key in [*GROUP_KPIS, "bottleneck_stage"]},
+    }
+
+def _common_dtypes(shard_dtypes: list[dict]) -> dict:
+    """Per-column dtype a single read_csv of the whole file would have inferred."""
+    out = {}
+    for col in shard_dtypes[0]:
+        kinds = [d[col] for d in shard_dtypes]
+        if all(k == kinds[0] for k in kinds):
+            out[col] = kinds[0]
+        elif all(pd.api.types.is_numeric_dtype(k) and not pd.api.types.is_bool_dtype(k) for k in kinds):
+            out[col] = np.result_type(*kinds)
+        else:
+            out[col] = object
+    return out
+
+def _merge_group(partials: list[pd.DataFrame], key: str) -> pd.DataFrame:
+    merged = pd.concat(partials).groupby(level=0).sum().sort_index()
+    return pd.DataFrame({
+        key: merged.index,
+        "tickets": merged["tickets"].to_numpy(),
+        "avg_cycle_time_hours": (merged["cycle_sum"] / merged["cycle_n"]).to_numpy(),
+        "sla_breach_rate": (merged["breached"] / merged["rows"]).to_numpy(),
+    })
+
+def _concat_csv(out_path: str, columns: list[str], paths: list[str]) -> None:
+    with open(out_path, "wb") as out:
+        out.write((",".join(columns) + "\n").encode("utf-8"))
+        for p in paths:
+            with open(p, "rb") as f:
+                shutil.copyfileobj(f, out)
+
+def analyze_parallel(path: str, workers: int) -> dict[str, pd.DataFrame]:
+    """
+    Byte-range shards are parsed in worker processes and hash-partitioned on
+    ticket_id, so drop_duplicates and the duplicate-ticket flag see every row of
+    a ticket. Each bucket is validated and pre-aggregated in a worker; the
+    partial sums are merged into the same KPI tables as the sequential path.
+    Clean/rejected rows are written per bucket and concatenated (grouped by
+    bucket rather than in file order).
+    """
+    names, ranges = shard_ranges(path, workers)
+    if not ranges:
+        return analyze(path)
+    n_buckets = workers
+
+    with tempfile.TemporaryDirectory(prefix="tickets_") as tmp_dir, ProcessPoolExecutor(max_workers=workers) as pool:
+        shards = list(pool.map(_parse_shard, [path] * len(ranges), [a for a, _ in ranges], [b for _, b in ranges],
+                               [names] * len(ranges), range(len(ranges)), [n_buckets] * len(ranges),
+                               [tmp_dir] * len(ranges)))
+        dtypes = _common_dtypes([s["dtypes"] for s in shards])
+        buckets = list(pool.map(_process_bucket, range(n_buckets), [len(ranges)] * n_buckets,
+                                [dtypes] * n_buckets, [tmp_dir] * n_buckets))
+
+        os.makedirs(DATA_DIR, exist_ok=True)
+        _concat_csv(os.path.join(DATA_DIR, "tickets_clean.csv"), buckets[0]["clean_columns"],
+                    [b["clean_path"] for b in buckets])
+        _concat_csv(os.path.join(DATA_DIR, "tickets_rejected.csv"), buckets[0]["rejected_columns"],
+                    [b["rejected_path"] for b in buckets])
+
+    rows_raw = sum(s["rows"] for s in shards)
+    rows_dedup = sum(b["rows_dedup"] for b in buckets)
+    rows_clean = sum(b["rows_clean"] for b in buckets)
+    rows_rejected = sum(b["rows_rejected"] for b in buckets)
+    cycle = np.concatenate([b["cycle"] for b in buckets])
+
+    kpis = {
+        "kpi_overall.csv": overall_kpi(
+            rows_raw, rows_dedup, rows_clean, rows_rejected,
+            float(np.nanmean(cycle)) if len(cycle) else float("nan"),
+            float(np.nanmedian(cycle)) if len(cycle) else float("nan"),
+            sum(b["breached"] for b in buckets) / rows_clean if rows_clean else float("nan"),
+        ),
+    }
+    for key, fname in GROUP_KPIS.items():
+        kpis[fname] = (_merge_group([b["groups"][key] for b in buckets], key)
+                       .sort_values(["sla_breach_rate", "avg_cycle_time_hours"], ascending=False))
+    kpis["kpi_bottlenecks.csv"] = (_merge_group([b["groups"]["bottleneck_stage"] for b in buckets], "bottleneck_stage")
+                                   .drop(columns="sla_breach_rate")
+                                   .sort_values("tickets", ascending=False))
+    return kpis
+
+def analyze(path: str) -> dict[str, pd.DataFrame]:
+    df = pd.read_csv(path)
+
+    # Parse timestamps
+    for c in TS_COLS:
+        df[c] = parse_dt(df[c])
+
+    # Drop exact duplicate rows
+    before = len(df)
+    df = df.drop_duplicates()
+
+    clean, rejected = validate(df)
+
+    os.makedirs(DATA_DIR, exist_ok=True)
     clean.to_csv(os.path.join(DATA_DIR, "tickets_clean.csv"), index=False)
     rejected.to_csv(os.path.join(DATA_DIR, "tickets_rejected.csv"), index=False)
 
-    kpi_overall.to_csv(os.path.join(DATA_DIR, "kpi_overall.csv"), index=False)
-    by_priority.to_csv(os.path.join(DATA_DIR, "kpi_by_priority.csv"), index=False)
-    by_category.to_csv(os.path.join(DATA_DIR, "kpi_by_category.csv"), index=False)
-    by_owner.to_csv(os.path.join(DATA_DIR, "kpi_by_owner.csv"), index=False)
-    bottlenecks.to_csv(os.path.join(DATA_DIR, "kpi_bottlenecks.csv"), index=False)
+    # KPI tables
+    kpis = {
+        "kpi_overall.csv": overall_kpi(
+            before, len(df), len(clean), len(rejected),
+            clean["cycle_time_hours"].mean(), clean["cycle_time_hours"].median(), clean["sla_breached"].mean(),
+        ),
+    }
+    for key, fname in GROUP_KPIS.items():
+        kpis[fname] = group_kpi(clean, key)
+    kpis["kpi_bottlenecks.csv"] = bottleneck_kpi(clean)
+    return kpis
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Ticket workflow validation and KPI tables.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes for sharded parsing/validation (1 = single process, 0 = all cores)")
+    parser.add_argument("--no-cache", action="store_true", help="always recompute; do not read or write the result cache")
+    parser.add_argument("--verify-cache", action="store_true",
+                        help="recompute even on a cache hit and fail if there is no cached result or it differs")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+
+    if not os.path.exists(RAW_PATH):
+        raise FileNotFoundError(f"Missing raw file: {RAW_PATH}. Run generate_data.py first.")
+
+    # Parallel output only differs from sequential in clean/rejected row order, which depends on workers
+    params = {"workers": workers if workers > 1 else 1, "ts_cols": TS_COLS, "stage_cols": STAGE_COLS, "group_kpis": GROUP_KPIS}
+    cache = None if args.no_cache else ResultCache(
+        "bpa.analyze", [RAW_PATH], [os.path.join(DATA_DIR, f) for f in OUTPUT_FILES], params, [__file__])
+
+    if cache is not None and not args.verify_cache and cache.restore():
+        kpis = {f: pd.read_csv(os.path.join(DATA_DIR, f)) for f in ("kpi_overall.csv", "kpi_bottlenecks.csv")}
+        print(f"✅ Analysis restored from cache ({cache.key})")
+    else:
+        kpis = analyze_parallel(RAW_PATH, workers) if workers > 1 else analyze(RAW_PATH)
+
+        # Export outputs
+        for fname, df in kpis.items():
+            df.to_csv(os.path.join(DATA_DIR, fname), index=False)
+
+        problems = cache.verify() if cache is not None and args.verify_cache else []
+        if cache is not None:
+            cache.store()
+        if problems:
+            raise SystemExit("❌ Cache verification failed:\n - " + "\n - ".join(problems))
+
+        print("✅ Analysis complete")
 
     # Print summary
-    print("✅ Analysis complete")
-    print(kpi_overall.to_string(index=False))
+    print(kpis["kpi_overall.csv"].to_string(index=False))
     print("\nTop bottleneck stages:")
-    print(bottlenecks.head(5).to_string(index=False))
+    print(kpis["kpi_bottlenecks.csv"].head(5).to_string(index=False))
     print(f"\nExports saved in: {os.path.abspath(DATA_DIR)}")
 
 if __name__ == "__main__":
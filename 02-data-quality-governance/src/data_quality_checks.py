@@ -1,11 +1,18 @@
 ﻿from __future__ import annotations
 
+import argparse
+import hashlib
 import os
+import pickle
 import re
-from datetime import datetime
+import sys
+from datetime import date, datetime
 import numpy as np
 import pandas as pd
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from result_cache import ResultCache  # repo-root helper shared by the pipelines
+
 BASE_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "data"))
 
@@ -15,6 +22,10 @@ TX_PATH = os.path.join(DATA_DIR, "raw_transactions.csv")
 ISSUES_PATH = os.path.join(DATA_DIR, "dq_issues.csv")
 SUMMARY_PATH = os.path.join(DATA_DIR, "dq_summary.csv")
 
+# Per-partition results for incremental runs (one pickle per transaction month)
+CACHE_DIR = os.path.join(DATA_DIR, "dq_cache")
+CACHE_VERSION = 1
+
 EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 
 ALLOWED_COUNTRIES = {"US", "CA", "MX", "GB", "DE", "IN"}
@@ -22,6 +33,28 @@ ALLOWED_STATUS = {"Active", "Inactive"}
 ALLOWED_CURRENCY = {"USD", "CAD", "GBP", "EUR"}
 ALLOWED_CHANNEL = {"Web", "Mobile", "Store", "Partner"}
 
+CUSTOMER_REQUIRED = ["customer_id", "email", "signup_date", "country", "status"]
+TX_REQUIRED = ["transaction_id", "customer_id", "transaction_date", "amount", "currency", "channel"]
+
+# Transaction rules in output order; issues are sorted by (rule, row) so that
+# incremental and full runs write identical dq_issues.csv files.
+TX_RULE_ORDER = [
+    ("transaction_id", "not_null"),
+    ("transaction_id", "unique"),
+    ("customer_id", "not_null"),
+    ("customer_id", "fk_exists"),
+    ("transaction_date", "not_null"),
+    ("transaction_date", "valid_date"),
+    ("transaction_date", "not_future"),
+    ("amount", "not_null"),
+    ("amount", "positive"),
+    ("currency", "allowed_values"),
+    ("channel", "allowed_values"),
+]
+TX_RULE_SEQ = {key: i for i, key in enumerate(TX_RULE_ORDER)}
+
+NULL_KEY = "\x00null"
+
 def _to_dt(s: pd.Series) -> pd.Series:
     return pd.to_datetime(s, errors="coerce")
 
@@ -35,27 +68,33 @@ def add_issue(issues: list[dict], table: str, record_id: str, column: str, rule:
         "details": details,
     })
 
-def main() -> None:
-    if not os.path.exists(CUSTOMERS_PATH) or not os.path.exists(TX_PATH):
-        raise FileNotFoundError("Missing raw data. Run src/generate_data.py first.")
-
-    customers = pd.read_csv(CUSTOMERS_PATH, dtype=str)
-    tx = pd.read_csv(TX_PATH)
-
-    # Normalize dtypes
-    tx["amount"] = pd.to_numeric(tx["amount"], errors="coerce")
-    customers["signup_date_dt"] = _to_dt(customers.get("signup_date"))
-    tx["transaction_date_dt"] = _to_dt(tx.get("transaction_date"))
-
-    now = pd.Timestamp(datetime.now())
-
+def _is_blank(s: pd.Series) -> pd.Series:
+    return s.isna() | (s.astype(str).str.strip() == "")
+
+def fingerprint(df: pd.DataFrame) -> str:
+    """Size + content hash of a frame (row order matters, index does not)."""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+    return f"{len(df)}:{digest}"
+
+def rules_fingerprint() -> str:
+    """Changes whenever the transaction rule configuration or the rule code changes."""
+    with open(__file__, "rb") as f:
+        source = hashlib.sha1(f.read()).hexdigest()
+    spec = repr((CACHE_VERSION, TX_RULE_ORDER, sorted(ALLOWED_CURRENCY), sorted(ALLOWED_CHANNEL), source))
+    return hashlib.sha1(spec.encode("utf-8")).hexdigest()
+
+def tx_keys(s: pd.Series) -> pd.Series:
+    """transaction_id as hashable keys; nulls share one key, like duplicated() does."""
+    return s.astype(str).where(s.notna(), NULL_KEY)
+
+# -------------------------
+# Customers rules
+# -------------------------
+def check_customers(customers: pd.DataFrame, now: pd.Timestamp) -> list[dict]:
     issues: list[dict] = []
 
-    # -------------------------
-    # Customers rules
-    # -------------------------
     # C1: customer_id not null
-    null_id = customers["customer_id"].isna() | (customers["customer_id"].astype(str).str.strip() == "")
+    null_id = _is_blank(customers["customer_id"])
     for idx in customers.index[null_id]:
         add_issue(issues, "customers", f"row_{idx}", "customer_id", "not_null", "high", "customer_id is missing")
 
@@ -66,7 +105,7 @@ def main() -> None:
         add_issue(issues, "customers", cid, "customer_id", "unique", "high", "duplicate customer_id")
 
     # C3: email not null
-    email_null = customers["email"].isna() | (customers["email"].astype(str).str.strip() == "")
+    email_null = _is_blank(customers["email"])
     for idx in customers.index[email_null]:
         cid = str(customers.loc[idx, "customer_id"])
         add_issue(issues, "customers", cid, "email", "not_null", "medium", "email is missing")
@@ -101,113 +140,272 @@ def main() -> None:
         cid = str(customers.loc[idx, "customer_id"])
         add_issue(issues, "customers", cid, "status", "allowed_values", "low", f"unexpected status: {customers.loc[idx, 'status']}")
 
-    # -------------------------
-    # Transactions rules
-    # -------------------------
-    # T1: transaction_id not null + unique
-    tx_null_id = tx["transaction_id"].isna() | (tx["transaction_id"].astype(str).str.strip() == "")
-    for idx in tx.index[tx_null_id]:
-        add_issue(issues, "transactions", f"row_{idx}", "transaction_id", "not_null", "high", "transaction_id is missing")
+    return issues
+
+# -------------------------
+# Transactions rules (per month partition)
+# -------------------------
+def _add_tx_issue(issues: list[dict], part: pd.DataFrame, pos: int, column: str, rule: str, severity: str, details: str) -> None:
+    """Transaction issue keyed by partition position; row_<idx> ids are filled in at assembly."""
+    record_id = None
+    if (column, rule) != ("transaction_id", "not_null"):
+        record_id = str(part.loc[pos, "transaction_id"])
+    add_issue(issues, "transactions", record_id, column, rule, severity, details)
+    issues[-1]["_seq"] = TX_RULE_SEQ[(column, rule)]
+    issues[-1]["_pos"] = int(pos)
+
+def check_tx_partition(part: pd.DataFrame, now: pd.Timestamp) -> list[dict]:
+    """Row-local transaction rules. Positions are relative to the partition."""
+    part = part.reset_index(drop=True)
+    issues: list[dict] = []
 
-    tx_dup = tx["transaction_id"].duplicated(keep=False)
-    for idx in tx.index[tx_dup.fillna(False)]:
-        tid = str(tx.loc[idx, "transaction_id"])
-        add_issue(issues, "transactions", tid, "transaction_id", "unique", "high", "duplicate transaction_id")
+    # T1: transaction_id not null (unique is resolved across partitions)
+    for pos in part.index[_is_blank(part["transaction_id"])]:
+        _add_tx_issue(issues, part, pos, "transaction_id", "not_null", "high", "transaction_id is missing")
 
     # T2: customer_id not null
-    tx_cust_null = tx["customer_id"].isna() | (tx["customer_id"].astype(str).str.strip() == "")
-    for idx in tx.index[tx_cust_null]:
-        tid = str(tx.loc[idx, "transaction_id"])
-        add_issue(issues, "transactions", tid, "customer_id", "not_null", "high", "customer_id is missing")
-
-    # T3: referential integrity (customer exists)
-    customer_set = set(customers["customer_id"].dropna().astype(str).tolist())
-    orphan = ~tx["customer_id"].astype(str).isin(customer_set)
-    for idx in tx.index[orphan.fillna(True)]:
-        tid = str(tx.loc[idx, "transaction_id"])
-        add_issue(issues, "transactions", tid, "customer_id", "fk_exists", "high", f"customer_id not found: {tx.loc[idx, 'customer_id']}")
+    for pos in part.index[_is_blank(part["customer_id"])]:
+        _add_tx_issue(issues, part, pos, "customer_id", "not_null", "high", "customer_id is missing")
 
     # T4: transaction_date valid + not null + not in future
-    tx_date_null = tx["transaction_date"].isna() | (tx["transaction_date"].astype(str).str.strip() == "")
-    for idx in tx.index[tx_date_null]:
-        tid = str(tx.loc[idx, "transaction_id"])
-        add_issue(issues, "transactions", tid, "transaction_date", "not_null", "high", "transaction_date is missing")
+    tx_date_null = _is_blank(part["transaction_date"])
+    for pos in part.index[tx_date_null]:
+        _add_tx_issue(issues, part, pos, "transaction_date", "not_null", "high", "transaction_date is missing")
 
-    tx_bad_date = tx["transaction_date_dt"].isna() & ~tx_date_null
-    for idx in tx.index[tx_bad_date]:
-        tid = str(tx.loc[idx, "transaction_id"])
-        add_issue(issues, "transactions", tid, "transaction_date", "valid_date", "high", f"invalid transaction_date: {tx.loc[idx, 'transaction_date']}")
+    tx_bad_date = part["transaction_date_dt"].isna() & ~tx_date_null
+    for pos in part.index[tx_bad_date]:
+        _add_tx_issue(issues, part, pos, "transaction_date", "valid_date", "high", f"invalid transaction_date: {part.loc[pos, 'transaction_date']}")
 
-    tx_future = tx["transaction_date_dt"].notna() & (tx["transaction_date_dt"] > now)
-    for idx in tx.index[tx_future]:
-        tid = str(tx.loc[idx, "transaction_id"])
-        add_issue(issues, "transactions", tid, "transaction_date", "not_future", "medium", f"future transaction_date: {tx.loc[idx, 'transaction_date']}")
+    # A date that is past today stays past, so only dates after `now` are kept
+    # as candidates and re-filtered against the clock of the run that reuses them.
+    tx_future = part["transaction_date_dt"].notna() & (part["transaction_date_dt"] > now)
+    for pos in part.index[tx_future]:
+        _add_tx_issue(issues, part, pos, "transaction_date", "not_future", "medium", f"future transaction_date: {part.loc[pos, 'transaction_date']}")
+        issues[-1]["_ts"] = part.loc[pos, "transaction_date_dt"]
 
     # T5: amount valid (not null, > 0)
-    amt_null = tx["amount"].isna()
-    for idx in tx.index[amt_null]:
-        tid = str(tx.loc[idx, "transaction_id"])
-        add_issue(issues, "transactions", tid, "amount", "not_null", "high", "amount is missing or non-numeric")
+    for pos in part.index[part["amount"].isna()]:
+        _add_tx_issue(issues, part, pos, "amount", "not_null", "high", "amount is missing or non-numeric")
 
-    amt_bad = tx["amount"].notna() & (tx["amount"] <= 0)
-    for idx in tx.index[amt_bad]:
-        tid = str(tx.loc[idx, "transaction_id"])
-        add_issue(issues, "transactions", tid, "amount", "positive", "high", f"non-positive amount: {tx.loc[idx, 'amount']}")
+    amt_bad = part["amount"].notna() & (part["amount"] <= 0)
+    for pos in part.index[amt_bad]:
+        _add_tx_issue(issues, part, pos, "amount", "positive", "high", f"non-positive amount: {part.loc[pos, 'amount']}")
 
     # T6: currency allowed
-    bad_curr = ~tx["currency"].astype(str).isin(ALLOWED_CURRENCY)
-    for idx in tx.index[bad_curr.fillna(True)]:
-        tid = str(tx.loc[idx, "transaction_id"])
-        add_issue(issues, "transactions", tid, "currency", "allowed_values", "low", f"unexpected currency: {tx.loc[idx, 'currency']}")
+    bad_curr = ~part["currency"].astype(str).isin(ALLOWED_CURRENCY)
+    for pos in part.index[bad_curr.fillna(True)]:
+        _add_tx_issue(issues, part, pos, "currency", "allowed_values", "low", f"unexpected currency: {part.loc[pos, 'currency']}")
 
     # T7: channel allowed
-    bad_channel = ~tx["channel"].astype(str).isin(ALLOWED_CHANNEL)
-    for idx in tx.index[bad_channel.fillna(True)]:
-        tid = str(tx.loc[idx, "transaction_id"])
-        add_issue(issues, "transactions", tid, "channel", "allowed_values", "low", f"unexpected channel: {tx.loc[idx, 'channel']}")
-
-    issues_df = pd.DataFrame(issues)
-
-    # -------------------------
-    # Scorecard summary
-    # -------------------------
-    def table_summary(table_name: str, df: pd.DataFrame, pk_col: str, required_cols: list[str]) -> dict:
-        # Completeness: required fields non-null rate
-        completeness_rates = {}
-        for c in required_cols:
-            non_null = df[c].notna() & (df[c].astype(str).str.strip() != "")
-            completeness_rates[f"completeness_{c}"] = float(non_null.mean())
-
-        completeness_overall = float(np.mean(list(completeness_rates.values()))) if completeness_rates else 1.0
-
-        # Uniqueness: pk duplicates rate
-        dup_rate = float(df[pk_col].duplicated(keep=False).mean())
-
-        # Validity: from issues table for this table
-        table_issues = issues_df[issues_df["table"] == table_name] if not issues_df.empty else pd.DataFrame()
-        issue_rate = float(len(table_issues) / max(len(df), 1))
-
-        # Simple quality score (0..100): 100 - penalties
-        # (This is intentionally simple and explainable)
-        score = 100.0
-        score -= issue_rate * 60.0
-        score -= (1.0 - completeness_overall) * 30.0
-        score -= dup_rate * 10.0
-        score = float(max(0.0, min(100.0, score)))
-
-        return {
-            "table": table_name,
-            "rows": int(len(df)),
-            "issue_count": int(len(table_issues)),
-            "issue_rate": issue_rate,
-            "duplicate_rate": dup_rate,
-            "completeness_overall": completeness_overall,
-            "quality_score": score,
-            **completeness_rates,
-        }
-
-    cust_sum = table_summary("customers", customers, "customer_id", ["customer_id", "email", "signup_date", "country", "status"])
-    tx_sum = table_summary("transactions", tx, "transaction_id", ["transaction_id", "customer_id", "transaction_date", "amount", "currency", "channel"])
+    bad_channel = ~part["channel"].astype(str).isin(ALLOWED_CHANNEL)
+    for pos in part.index[bad_channel.fillna(True)]:
+        _add_tx_issue(issues, part, pos, "channel", "allowed_values", "low", f"unexpected channel: {part.loc[pos, 'channel']}")
+
+    return issues
+
+def check_tx_fk(part: pd.DataFrame, customer_set: set[str]) -> list[dict]:
+    """T3: referential integrity (customer exists). Depends on the customers table."""
+    part = part.reset_index(drop=True)
+    issues: list[dict] = []
+    orphan = ~part["customer_id"].astype(str).isin(customer_set)
+    for pos in part.index[orphan.fillna(True)]:
+        _add_tx_issue(issues, part, pos, "customer_id", "fk_exists", "high", f"customer_id not found: {part.loc[pos, 'customer_id']}")
+    return issues
+
+def check_tx_unique(part: pd.DataFrame, keys: pd.Series, dup_keys: set[str]) -> list[dict]:
+    """T1: transaction_id unique, resolved against the global key index."""
+    part = part.reset_index(drop=True)
+    issues: list[dict] = []
+    for pos in part.index[keys.reset_index(drop=True).isin(dup_keys)]:
+        _add_tx_issue(issues, part, pos, "transaction_id", "unique", "high", "duplicate transaction_id")
+    return issues
+
+def partition_counters(part: pd.DataFrame, keys: pd.Series) -> dict:
+    return {
+        "rows": int(len(part)),
+        "non_null": {c: int((~_is_blank(part[c])).sum()) for c in TX_REQUIRED},
+        "key_counts": keys.value_counts().to_dict(),
+    }
+
+def _cache_path(month: str) -> str:
+    return os.path.join(CACHE_DIR, f"tx_{month}.pkl")
+
+def load_partition(month: str) -> dict | None:
+    path = _cache_path(month)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+def save_partition(month: str, entry: dict) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = _cache_path(month) + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, _cache_path(month))
+
+def prune_cache(months: set[str]) -> None:
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for fname in os.listdir(CACHE_DIR):
+        if fname.startswith("tx_") and fname.endswith(".pkl") and fname[3:-4] not in months:
+            os.remove(os.path.join(CACHE_DIR, fname))
+
+def check_transactions(tx: pd.DataFrame, customer_set: set[str], now: pd.Timestamp, use_cache: bool = True) -> tuple[list[dict], dict]:
+    """
+    Validate transactions partitioned by transaction_date month.
+
+    Each partition's row-local issues and summary counters are cached alongside a
+    fingerprint of its rows; unchanged partitions are reused as-is. The `unique`
+    rule is resolved through the union of the cached per-partition key counts,
+    and `fk_exists` results are cached against a fingerprint of the customer_id
+    set, so a customers change only re-runs the FK rule. Both cache keys include
+    a hash of this module's source, so editing any rule invalidates every month.
+
+    Returns (issues, counters) where counters feed the transactions scorecard.
+    """
+    raw_cols = [c for c in tx.columns if not c.endswith("_dt")]
+    month = tx["transaction_date_dt"].dt.strftime("%Y-%m").fillna("unknown")
+    rules_fp = rules_fingerprint()
+    customers_fp = fingerprint(pd.DataFrame({"customer_id": sorted(customer_set)})) + ":" + rules_fp
+
+    parts: dict[str, pd.DataFrame] = {m: g for m, g in tx.groupby(month, sort=True)}
+    entries: dict[str, dict] = {}
+    reused = fk_rechecked = 0
+
+    for m, part in parts.items():
+        fp = fingerprint(part[raw_cols])
+        entry = load_partition(m) if use_cache else None
+        if entry is None or entry.get("fingerprint") != fp or entry.get("rules") != rules_fp:
+            keys = tx_keys(part["transaction_id"])
+            entry = {
+                "fingerprint": fp,
+                "rules": rules_fp,
+                "issues": check_tx_partition(part, now),
+                **partition_counters(part, keys),
+            }
+        else:
+            reused += 1
+
+        if entry.get("fk_customers") != customers_fp:
+            entry["fk_customers"] = customers_fp
+            entry["fk_issues"] = check_tx_fk(part, customer_set)
+            fk_rechecked += 1
+            save_partition(m, entry)
+
+        entries[m] = entry
+
+    prune_cache(set(parts))
+
+    # Global key index: a key seen more than once across all partitions is a duplicate
+    key_index: dict[str, int] = {}
+    for entry in entries.values():
+        for k, n in entry["key_counts"].items():
+            key_index[k] = key_index.get(k, 0) + n
+    dup_keys = {k for k, n in key_index.items() if n > 1}
+
+    records: list[dict] = []
+    dup_rows = 0
+    for m, part in parts.items():
+        entry = entries[m]
+        part_issues = list(entry["issues"]) + list(entry["fk_issues"])
+        if dup_keys:
+            keys = tx_keys(part["transaction_id"])
+            unique_issues = check_tx_unique(part, keys, dup_keys)
+            dup_rows += len(unique_issues)
+            part_issues += unique_issues
+        for issue in part_issues:
+            if "_ts" in issue and not issue["_ts"] > now:
+                continue
+            rec = {k: v for k, v in issue.items() if k != "_ts"}
+            rec["_idx"] = int(part.index[issue["_pos"]])
+            if rec["record_id"] is None:
+                rec["record_id"] = f"row_{rec['_idx']}"
+            records.append(rec)
+
+    records.sort(key=lambda r: (r["_seq"], r["_idx"]))
+    for rec in records:
+        del rec["_seq"], rec["_pos"], rec["_idx"]
+
+    counters = {
+        "rows": sum(e["rows"] for e in entries.values()),
+        "non_null": {c: sum(e["non_null"][c] for e in entries.values()) for c in TX_REQUIRED},
+        "dup_rows": dup_rows,
+    }
+
+    print(f"Transaction partitions: {len(parts)} total, {reused} reused from cache, "
+          f"{len(parts) - reused} re-validated, {fk_rechecked} FK re-checked")
+    return records, counters
+
+def table_counters(df: pd.DataFrame, pk_col: str, required_cols: list[str]) -> dict:
+    return {
+        "rows": int(len(df)),
+        "non_null": {c: int((~_is_blank(df[c])).sum()) for c in required_cols},
+        "dup_rows": int(df[pk_col].duplicated(keep=False).sum()),
+    }
+
+# -------------------------
+# Scorecard summary
+# -------------------------
+def table_summary(table_name: str, counters: dict, issue_count: int) -> dict:
+    rows = counters["rows"]
+
+    # Completeness: required fields non-null rate
+    completeness_rates = {
+        f"completeness_{c}": float(n / max(rows, 1)) for c, n in counters["non_null"].items()
+    }
+
+    completeness_overall = float(np.mean(list(completeness_rates.values()))) if completeness_rates else 1.0
+
+    # Uniqueness: pk duplicates rate
+    dup_rate = float(counters["dup_rows"] / max(rows, 1))
+
+    # Validity: from issues table for this table
+    issue_rate = float(issue_count / max(rows, 1))
+
+    # Simple quality score (0..100): 100 - penalties
+    # (This is intentionally simple and explainable)
+    score = 100.0
+    score -= issue_rate * 60.0
+    score -= (1.0 - completeness_overall) * 30.0
+    score -= dup_rate * 10.0
+    score = float(max(0.0, min(100.0, score)))
+
+    return {
+        "table": table_name,
+        "rows": int(rows),
+        "issue_count": int(issue_count),
+        "issue_rate": issue_rate,
+        "duplicate_rate": dup_rate,
+        "completeness_overall": completeness_overall,
+        "quality_score": score,
+        **completeness_rates,
+    }
+
+def run_checks(full: bool = False) -> pd.DataFrame:
+    """Run every rule, write dq_issues.csv / dq_summary.csv and return the issues."""
+    customers = pd.read_csv(CUSTOMERS_PATH, dtype=str)
+    tx = pd.read_csv(TX_PATH)
+
+    # Normalize dtypes
+    tx["amount"] = pd.to_numeric(tx["amount"], errors="coerce")
+    customers["signup_date_dt"] = _to_dt(customers.get("signup_date"))
+    tx["transaction_date_dt"] = _to_dt(tx.get("transaction_date"))
+
+    now = pd.Timestamp(datetime.now())
+
+    customer_issues = check_customers(customers, now)
+
+    customer_set = set(customers["customer_id"].dropna().astype(str).tolist())
+    tx_issues, tx_counters = check_transactions(tx, customer_set, now, use_cache=not full)
+
+    issues_df = pd.DataFrame(customer_issues + tx_issues)
+
+    cust_sum = table_summary("customers", table_counters(customers, "customer_id", CUSTOMER_REQUIRED), len(customer_issues))
+    tx_sum = table_summary("transactions", tx_counters, len(tx_issues))
 
     overall_score = float(np.mean([cust_sum["quality_score"], tx_sum["quality_score"]]))
 
@@ -231,7 +429,50 @@ def main() -> None:
     issues_df.to_csv(ISSUES_PATH, index=False)
     summary_df.to_csv(SUMMARY_PATH, index=False)
 
-    print("✅ Data quality checks complete")
+    return issues_df
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rule-based data quality checks and scorecard.")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore cached partition and result caches and re-validate every transaction")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the result cache")
+    parser.add_argument("--verify-cache", action="store_true",
+                        help="recompute from scratch and fail if there is no cached result or it differs")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+
+    if not os.path.exists(CUSTOMERS_PATH) or not os.path.exists(TX_PATH):
+        raise FileNotFoundError("Missing raw data. Run src/generate_data.py first.")
+
+    # not_future rules compare against the current date, so results are reusable within a day
+    params = {
+        "allowed_countries": sorted(ALLOWED_COUNTRIES),
+        "allowed_status": sorted(ALLOWED_STATUS),
+        "allowed_currency": sorted(ALLOWED_CURRENCY),
+        "allowed_channel": sorted(ALLOWED_CHANNEL),
+        "email_re": EMAIL_RE.pattern,
+        "today": date.today().isoformat(),
+    }
+    cache = None if args.no_cache else ResultCache(
+        "dq.checks", [CUSTOMERS_PATH, TX_PATH], [ISSUES_PATH, SUMMARY_PATH], params, [__file__])
+
+    if cache is not None and not (args.full or args.verify_cache) and cache.restore():
+        issues_df = pd.read_csv(ISSUES_PATH)
+        print(f"✅ Data quality results restored from cache ({cache.key})")
+    else:
+        # Verification also bypasses the partition cache so nothing cached feeds the comparison
+        issues_df = run_checks(full=args.full or args.verify_cache)
+
+        problems = cache.verify() if cache is not None and args.verify_cache else []
+        if cache is not None:
+            cache.store()
+        if problems:
+            raise SystemExit("❌ Cache verification failed:\n - " + "\n - ".join(problems))
+
+        print("✅ Data quality checks complete")
+
     print(f"Violations: {len(issues_df):,} → {ISSUES_PATH}")
     print(f"Scorecard: {SUMMARY_PATH}")
     print("\nTop rules (by count):")
@@ -0,0 +1,34 @@
+﻿-- 01_schema_typed_dims.sql
+-- Typed storage: integer surrogate keys, natural IDs kept as attributes
+
+CREATE TABLE dim_dates (
+  day_key INTEGER PRIMARY KEY,      -- yyyymmdd
+  date TEXT NOT NULL,               -- ISO yyyy-mm-dd
+  month_key INTEGER NOT NULL,       -- yyyymm
+  month TEXT NOT NULL               -- yyyy-mm
+);
+
+CREATE TABLE dim_reps (
+  rep_key INTEGER PRIMARY KEY,
+  rep_id TEXT NOT NULL UNIQUE,
+  rep_name TEXT,
+  region TEXT
+);
+
+CREATE TABLE dim_customers (
+  customer_key INTEGER PRIMARY KEY,
+  customer_id TEXT NOT NULL UNIQUE,
+  customer_name TEXT,
+  segment TEXT,
+  region TEXT,
+  signup_date TEXT
+);
+
+CREATE TABLE dim_products (
+  product_key INTEGER PRIMARY KEY,
+  product_id TEXT NOT NULL UNIQUE,
+  product_name TEXT,
+  category TEXT,
+  list_price REAL,
+  unit_cost REAL
+);
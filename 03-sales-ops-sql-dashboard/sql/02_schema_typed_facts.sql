@@ -0,0 +1,42 @@
+﻿-- 02_schema_typed_facts.sql
+-- Typed storage: fact tables clustered by day (WITHOUT ROWID, date-leading primary keys)
+-- Also used for the optional per-month partition databases.
+
+CREATE TABLE fact_orders (
+  order_day INTEGER NOT NULL,       -- yyyymmdd, joins dim_dates.day_key
+  order_key INTEGER NOT NULL,
+  order_month INTEGER NOT NULL,     -- yyyymm
+  order_id TEXT NOT NULL,
+  customer_key INTEGER NOT NULL,
+  rep_key INTEGER NOT NULL,
+  channel TEXT,
+  discount_rate REAL,
+  PRIMARY KEY (order_day, order_key)
+) WITHOUT ROWID;
+
+CREATE TABLE fact_order_items (
+  order_day INTEGER NOT NULL,
+  order_key INTEGER NOT NULL,
+  line_no INTEGER NOT NULL,
+  product_key INTEGER NOT NULL,
+  quantity INTEGER,
+  unit_price REAL,
+  unit_cost REAL,
+  PRIMARY KEY (order_day, order_key, line_no)
+) WITHOUT ROWID;
+
+CREATE TABLE fact_returns (
+  return_day INTEGER NOT NULL,      -- yyyymmdd
+  return_key INTEGER NOT NULL,
+  return_month INTEGER NOT NULL,    -- yyyymm
+  return_id TEXT NOT NULL,
+  order_day INTEGER NOT NULL,
+  order_key INTEGER NOT NULL,
+  reason TEXT,
+  PRIMARY KEY (return_day, return_key)
+) WITHOUT ROWID;
+
+CREATE UNIQUE INDEX idx_orders_key ON fact_orders(order_key);
+CREATE INDEX idx_orders_month ON fact_orders(order_month);
+CREATE INDEX idx_orders_customer ON fact_orders(customer_key);
+CREATE INDEX idx_returns_order ON fact_returns(order_day, order_key);
@@ -8,6 +8,7 @@ SELECT
   oi.order_id,
   o.order_date,
   substr(o.order_date, 1, 7) AS order_month,
+  CAST(substr(o.order_date, 1, 4) || substr(o.order_date, 6, 2) AS INTEGER) AS order_month_key,
   o.channel,
   o.discount_rate,
   o.customer_id,
@@ -38,6 +39,7 @@ SELECT
   o.order_id,
   o.order_date,
   substr(o.order_date, 1, 7) AS order_month,
+  CAST(substr(o.order_date, 1, 4) || substr(o.order_date, 6, 2) AS INTEGER) AS order_month_key,
   o.channel,
   o.discount_rate,
   o.customer_id,
@@ -58,9 +60,11 @@ SELECT
   ret.order_id,
   ret.return_date,
   substr(ret.return_date, 1, 7) AS return_month,
+  CAST(substr(ret.return_date, 1, 4) || substr(ret.return_date, 6, 2) AS INTEGER) AS return_month_key,
   ret.reason,
   o.order_date,
   substr(o.order_date, 1, 7) AS order_month,
+  CAST(substr(o.order_date, 1, 4) || substr(o.order_date, 6, 2) AS INTEGER) AS order_month_key,
   o.channel,
   o.customer_id,
   c.segment,
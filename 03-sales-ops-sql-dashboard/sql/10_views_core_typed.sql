@@ -0,0 +1,84 @@
+﻿-- 10_views_core_typed.sql
+-- Core views for the typed storage mode. Same names and columns as
+-- 10_views_core.sql, so the KPI scripts and Power BI files work unchanged.
+-- *_month_key is the integer yyyymm stored on the facts: grouping and range
+-- filters on it use idx_orders_month and the date-leading primary keys.
+
+DROP VIEW IF EXISTS v_order_items_enriched;
+CREATE VIEW v_order_items_enriched AS
+SELECT
+  o.order_id || '-' || oi.line_no AS order_item_id,
+  o.order_id,
+  d.date AS order_date,
+  d.month AS order_month,
+  o.order_month AS order_month_key,
+  o.channel,
+  o.discount_rate,
+  c.customer_id,
+  c.customer_name,
+  c.segment,
+  c.region AS customer_region,
+  r.rep_id,
+  r.rep_name,
+  r.region AS rep_region,
+  p.product_id,
+  p.product_name,
+  p.category,
+  oi.quantity,
+  oi.unit_price,
+  oi.unit_cost,
+  ROUND(oi.quantity * oi.unit_price, 2) AS revenue,
+  ROUND(oi.quantity * oi.unit_cost, 2) AS cost,
+  ROUND((oi.quantity * oi.unit_price) - (oi.quantity * oi.unit_cost), 2) AS gross_profit
+FROM fact_order_items oi
+JOIN fact_orders o ON o.order_day = oi.order_day AND o.order_key = oi.order_key
+JOIN dim_dates d ON d.day_key = o.order_day
+JOIN dim_customers c ON c.customer_key = o.customer_key
+JOIN dim_reps r ON r.rep_key = o.rep_key
+JOIN dim_products p ON p.product_key = oi.product_key;
+
+DROP VIEW IF EXISTS v_orders_enriched;
+CREATE VIEW v_orders_enriched AS
+SELECT
+  o.order_id,
+  d.date AS order_date,
+  d.month AS order_month,
+  o.order_month AS order_month_key,
+  o.channel,
+  o.discount_rate,
+  c.customer_id,
+  c.customer_name,
+  c.segment,
+  c.region AS customer_region,
+  r.rep_id,
+  r.rep_name,
+  r.region AS rep_region
+FROM fact_orders o
+JOIN dim_dates d ON d.day_key = o.order_day
+JOIN dim_customers c ON c.customer_key = o.customer_key
+JOIN dim_reps r ON r.rep_key = o.rep_key;
+
+DROP VIEW IF EXISTS v_returns_enriched;
+CREATE VIEW v_returns_enriched AS
+SELECT
+  ret.return_id,
+  o.order_id,
+  rd.date AS return_date,
+  rd.month AS return_month,
+  ret.return_month AS return_month_key,
+  ret.reason,
+  od.date AS order_date,
+  od.month AS order_month,
+  o.order_month AS order_month_key,
+  o.channel,
+  c.customer_id,
+  c.segment,
+  c.region AS customer_region,
+  r.rep_id,
+  r.region AS rep_region
+FROM fact_returns ret
+JOIN fact_orders o ON o.order_day = ret.order_day AND o.order_key = ret.order_key
+JOIN dim_dates rd ON rd.day_key = ret.return_day
+JOIN dim_dates od ON od.day_key = o.order_day
+JOIN dim_customers c ON c.customer_key = o.customer_key
+JOIN dim_reps r ON r.rep_key = o.rep_key;
@@ -5,21 +5,22 @@ DROP TABLE IF EXISTS kpi_monthly;
 CREATE TABLE kpi_monthly AS
 WITH item_month AS (
   SELECT
-    order_month,
+    order_month_key,
+    MIN(order_month) AS order_month,
     COUNT(DISTINCT order_id) AS orders,
     COUNT(DISTINCT customer_id) AS customers,
     SUM(revenue) AS revenue,
     SUM(cost) AS cost,
     SUM(gross_profit) AS gross_profit
   FROM v_order_items_enriched
-  GROUP BY order_month
+  GROUP BY order_month_key
 ),
 returns_month AS (
   SELECT
-    order_month,
+    order_month_key,
     COUNT(DISTINCT order_id) AS returned_orders
   FROM v_returns_enriched
-  GROUP BY order_month
+  GROUP BY order_month_key
 )
 SELECT
   im.order_month,
@@ -33,7 +34,7 @@ SELECT
   ROUND(CASE WHEN im.orders = 0 THEN 0 ELSE COALESCE(rm.returned_orders, 0) * 1.0 / im.orders END, 4) AS return_rate
 FROM item_month im
 LEFT JOIN returns_month rm
-  ON rm.order_month = im.order_month;
+  ON rm.order_month_key = im.order_month_key;
 
 DROP TABLE IF EXISTS kpi_by_region;
 CREATE TABLE kpi_by_region AS
@@ -86,14 +87,14 @@ ORDER BY returns DESC;
 DROP TABLE IF EXISTS kpi_returns_by_channel;
 CREATE TABLE kpi_returns_by_channel AS
 WITH orders AS (
-  SELECT order_month, channel, COUNT(DISTINCT order_id) AS orders
+  SELECT order_month_key, MIN(order_month) AS order_month, channel, COUNT(DISTINCT order_id) AS orders
   FROM v_orders_enriched
-  GROUP BY order_month, channel
+  GROUP BY order_month_key, channel
 ),
 rets AS (
-  SELECT order_month, channel, COUNT(DISTINCT order_id) AS returned_orders
+  SELECT order_month_key, channel, COUNT(DISTINCT order_id) AS returned_orders
   FROM v_returns_enriched
-  GROUP BY order_month, channel
+  GROUP BY order_month_key, channel
 )
 SELECT
   o.order_month,
@@ -103,5 +104,5 @@ SELECT
   ROUND(CASE WHEN o.orders = 0 THEN 0 ELSE COALESCE(r.returned_orders, 0) * 1.0 / o.orders END, 4) AS return_rate
 FROM orders o
 LEFT JOIN rets r
-  ON r.order_month = o.order_month AND r.channel = o.channel
-ORDER BY o.order_month, o.channel;
+  ON r.order_month_key = o.order_month_key AND r.channel = o.channel
+ORDER BY o.order_month_key, o.channel;
@@ -1,6 +1,9 @@
 ﻿from __future__ import annotations
 
+import argparse
 import os
+import secrets
+import shutil
 import sqlite3
 from datetime import datetime, timedelta
 import numpy as np
@@ -16,12 +19,153 @@ DATA_DIR = os.path.join(PROJECT_DIR, "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
 DB_PATH = os.path.join(DATA_DIR, "sales_ops.db")
+SQL_DIR = os.path.join(PROJECT_DIR, "sql")
+
+# Typed storage: integer keys + day/month ints, facts clustered by date
+TYPED_DIMS_SQL = os.path.join(SQL_DIR, "01_schema_typed_dims.sql")
+TYPED_FACTS_SQL = os.path.join(SQL_DIR, "02_schema_typed_facts.sql")
+MONTHS_DIR = os.path.join(DATA_DIR, "months")
 
 def rand_date(start: datetime, end: datetime) -> datetime:
     seconds = max(int((end - start).total_seconds()), 1)
     return start + timedelta(seconds=int(rng.integers(0, seconds)))
 
-def main() -> None:
+def read_sql(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def month_db_path(month: str) -> str:
+    return os.path.join(MONTHS_DIR, f"sales_ops_{month}.db")
+
+def day_key(iso: pd.Series) -> pd.Series:
+    """'2025-03-07' -> 20250307"""
+    return iso.str.replace("-", "", regex=False).astype("int64")
+
+def to_typed(reps: pd.DataFrame, customers: pd.DataFrame, products: pd.DataFrame,
+             orders: pd.DataFrame, order_items: pd.DataFrame, returns: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Same rows as the text tables, keyed by integers and sorted by each table's clustering key."""
+    reps = reps.assign(rep_key=np.arange(1, len(reps) + 1))
+    customers = customers.assign(customer_key=np.arange(1, len(customers) + 1))
+    products = products.assign(product_key=np.arange(1, len(products) + 1))
+
+    t_orders = pd.DataFrame({
+        "order_day": day_key(orders["order_date"]),
+        "order_key": np.arange(1, len(orders) + 1),
+        "order_id": orders["order_id"],
+        "customer_key": orders["customer_id"].map(customers.set_index("customer_id")["customer_key"]),
+        "rep_key": orders["rep_id"].map(reps.set_index("rep_id")["rep_key"]),
+        "channel": orders["channel"],
+        "discount_rate": orders["discount_rate"],
+    })
+    t_orders["order_month"] = t_orders["order_day"] // 100
+    order_lookup = t_orders.set_index("order_id")[["order_day", "order_key"]]
+
+    items = order_items.join(order_lookup, on="order_id")
+    t_items = pd.DataFrame({
+        "order_day": items["order_day"],
+        "order_key": items["order_key"],
+        "line_no": items.groupby("order_id").cumcount() + 1,
+        "product_key": items["product_id"].map(products.set_index("product_id")["product_key"]),
+        "quantity": items["quantity"],
+        "unit_price": items["unit_price"],
+        "unit_cost": items["unit_cost"],
+    })
+
+    rets = returns.join(order_lookup, on="order_id")
+    t_returns = pd.DataFrame({
+        "return_day": day_key(rets["return_date"]),
+        "return_key": np.arange(1, len(rets) + 1),
+        "return_id": rets["return_id"],
+        "order_day": rets["order_day"],
+        "order_key": rets["order_key"],
+        "reason": rets["reason"],
+    })
+    t_returns["return_month"] = t_returns["return_day"] // 100
+
+    dates = pd.Series(pd.concat([orders["order_date"], returns["return_date"]]).unique()).sort_values()
+    dim_dates = pd.DataFrame({"day_key": day_key(dates), "date": dates, "month": dates.str[:7]})
+    dim_dates["month_key"] = dim_dates["day_key"] // 100
+
+    return {
+        "dim_dates": dim_dates,
+        "dim_reps": reps[["rep_key", "rep_id", "rep_name", "region"]],
+        "dim_customers": customers[["customer_key", "customer_id", "customer_name", "segment", "region", "signup_date"]],
+        "dim_products": products[["product_key", "product_id", "product_name", "category", "list_price", "unit_cost"]],
+        "fact_orders": t_orders.sort_values(["order_day", "order_key"]),
+        "fact_order_items": t_items.sort_values(["order_day", "order_key", "line_no"]),
+        "fact_returns": t_returns.sort_values(["return_day", "return_key"]),
+    }
+
+def write_text(con: sqlite3.Connection, reps: pd.DataFrame, customers: pd.DataFrame, products: pd.DataFrame,
+               orders: pd.DataFrame, order_items: pd.DataFrame, returns: pd.DataFrame) -> None:
+    reps.to_sql("dim_reps", con, index=False)
+    customers.to_sql("dim_customers", con, index=False)
+    products.to_sql("dim_products", con, index=False)
+    orders.to_sql("fact_orders", con, index=False)
+    order_items.to_sql("fact_order_items", con, index=False)
+    returns.to_sql("fact_returns", con, index=False)
+
+    # helpful indexes
+    con.execute("CREATE INDEX idx_orders_date ON fact_orders(order_date);")
+    con.execute("CREATE INDEX idx_items_order ON fact_order_items(order_id);")
+    con.execute("CREATE INDEX idx_orders_customer ON fact_orders(customer_id);")
+    con.commit()
+
+def write_typed(con: sqlite3.Connection, tables: dict[str, pd.DataFrame]) -> None:
+    con.executescript(read_sql(TYPED_DIMS_SQL))
+    con.executescript(read_sql(TYPED_FACTS_SQL))
+    for name, df in tables.items():
+        df.to_sql(name, con, index=False, if_exists="append")
+    con.commit()
+
+def write_month_partitions(tables: dict[str, pd.DataFrame], generation: int) -> int:
+    """
+    One database per order month holding that month's facts (returns follow
+    their order's month). run_sql.py --months copies only the months asked for.
+    Each partition carries the main database's generation id, since its
+    surrogate keys only mean something next to that build's dimensions.
+    """
+    os.makedirs(MONTHS_DIR, exist_ok=True)
+
+    orders = tables["fact_orders"]
+    items = tables["fact_order_items"]
+    returns = tables["fact_returns"]
+    item_month = items["order_day"] // 100
+    return_order_month = returns["order_day"] // 100
+
+    months = 0
+    for month_key, o in orders.groupby("order_month"):
+        path = month_db_path(f"{month_key // 100:04d}-{month_key % 100:02d}")
+        con = sqlite3.connect(path)
+        try:
+            con.executescript(read_sql(TYPED_FACTS_SQL))
+            o.to_sql("fact_orders", con, index=False, if_exists="append")
+            items.loc[item_month == month_key].to_sql("fact_order_items", con, index=False, if_exists="append")
+            returns.loc[return_order_month == month_key].to_sql("fact_returns", con, index=False, if_exists="append")
+            con.execute(f"PRAGMA user_version = {generation}")
+            con.commit()
+        finally:
+            con.close()
+        months += 1
+    return months
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate the synthetic sales-ops SQLite database.")
+    parser.add_argument("--orders", type=int, default=22000,
+                        help="number of orders to generate (raise it to benchmark run_sql.py backends)")
+    parser.add_argument("--storage", choices=["text", "typed"], default="text",
+                        help="text: ISO dates and text IDs (default); typed: integer keys/day/month columns, "
+                             "facts clustered by date")
+    parser.add_argument("--month-partitions", action="store_true",
+                        help="also write one database per order month to data/months/ (typed storage only)")
+    args = parser.parse_args(argv)
+    if args.month_partitions and args.storage != "typed":
+        parser.error("--month-partitions requires --storage typed")
+    return args
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+
     now = datetime.now().replace(microsecond=0)
     start_18m = now - timedelta(days=30 * 18)
 
@@ -29,7 +173,7 @@ def main() -> None:
     n_customers = 3000
     n_products = 250
     n_reps = 18
-    n_orders = 22000
+    n_orders = args.orders
 
     regions = ["Midwest", "South", "Northeast", "West"]
     channels = ["Web", "Sales", "Partner"]
@@ -129,25 +273,29 @@ def main() -> None:
     # ---- Write to SQLite
     if os.path.exists(DB_PATH):
         os.remove(DB_PATH)
+    # Partitions from an earlier build would pair old facts with these dimensions
+    shutil.rmtree(MONTHS_DIR, ignore_errors=True)
+
+    # Stamped into sales_ops.db and every month partition (PRAGMA user_version)
+    generation = secrets.randbits(31) or 1
+
+    typed = to_typed(reps, customers, products, orders, order_items, returns) if args.storage == "typed" else None
 
     con = sqlite3.connect(DB_PATH)
     try:
-        reps.to_sql("dim_reps", con, index=False)
-        customers.to_sql("dim_customers", con, index=False)
-        products.to_sql("dim_products", con, index=False)
-        orders.to_sql("fact_orders", con, index=False)
-        order_items.to_sql("fact_order_items", con, index=False)
-        returns.to_sql("fact_returns", con, index=False)
-
-        # helpful indexes
-        con.execute("CREATE INDEX idx_orders_date ON fact_orders(order_date);")
-        con.execute("CREATE INDEX idx_items_order ON fact_order_items(order_id);")
-        con.execute("CREATE INDEX idx_orders_customer ON fact_orders(customer_id);")
+        if typed is None:
+            write_text(con, reps, customers, products, orders, order_items, returns)
+        else:
+            write_typed(con, typed)
+        con.execute(f"PRAGMA user_version = {generation}")
         con.commit()
     finally:
         con.close()
 
-    print(f"✅ Created SQLite DB: {DB_PATH}")
+    print(f"✅ Created SQLite DB ({args.storage} storage): {DB_PATH}")
+    if args.month_partitions:
+        n_months = write_month_partitions(typed, generation)
+        print(f"✅ Wrote {n_months} month partitions → {MONTHS_DIR}")
     print(f"Rows: customers={len(customers):,}, products={len(products):,}, orders={len(orders):,}, items={len(order_items):,}, returns={len(returns):,}")
 
 if __name__ == "__main__":
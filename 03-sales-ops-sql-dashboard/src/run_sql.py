@@ -1,12 +1,16 @@
 ﻿from __future__ import annotations
 
+import argparse
 import os
+import re
 import sqlite3
+import time
 
 BASE_DIR = os.path.dirname(__file__)
 PROJECT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
 DB_PATH = os.path.join(PROJECT_DIR, "data", "sales_ops.db")
 SQL_DIR = os.path.join(PROJECT_DIR, "sql")
+MONTHS_DIR = os.path.join(PROJECT_DIR, "data", "months")
 
 ORDER = [
     "10_views_core.sql",
@@ -14,27 +18,348 @@ ORDER = [
     "30_customer_cohorts.sql",
 ]
 
+# Typed storage (generate_sales_db.py --storage typed) swaps in its own core views
+VIEWS_TYPED = "10_views_core_typed.sql"
+TYPED_DIMS_SQL = "01_schema_typed_dims.sql"
+TYPED_FACTS_SQL = "02_schema_typed_facts.sql"
+
+DIM_TABLES = ["dim_reps", "dim_customers", "dim_products"]
+FACT_TABLES = ["fact_orders", "fact_order_items", "fact_returns"]
+
+MONTH_PART_RE = re.compile(r"^sales_ops_(\d{4}-\d{2})\.db$")
+
+CREATE_TABLE_RE = re.compile(r"CREATE\s+TABLE\s+(\w+)\s+AS", re.IGNORECASE)
+
+# Tolerance for --compare: engines sum floats in different orders
+ABS_TOL = 1e-6
+REL_TOL = 1e-9
+
 def read_sql(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
-def main() -> None:
-    if not os.path.exists(DB_PATH):
-        raise FileNotFoundError(f"Database not found: {DB_PATH}")
+def is_typed(con: sqlite3.Connection) -> bool:
+    return "order_key" in {r[1] for r in con.execute("PRAGMA table_info(fact_orders)")}
+
+def scripts(con: sqlite3.Connection) -> list[str]:
+    """ORDER, with the core views matching the database's storage mode."""
+    return [VIEWS_TYPED if is_typed(con) else ORDER[0]] + ORDER[1:]
+
+def base_tables(con: sqlite3.Connection) -> list[str]:
+    dims = ["dim_dates"] + DIM_TABLES if is_typed(con) else DIM_TABLES
+    return dims + FACT_TABLES
+
+def output_tables() -> list[str]:
+    """Tables built by the KPI scripts, in creation order."""
+    names: list[str] = []
+    for fname in ORDER:
+        names += CREATE_TABLE_RE.findall(read_sql(os.path.join(SQL_DIR, fname)))
+    return names
+
+# -------------------------
+# Backends
+# -------------------------
+def run_sqlite(con: sqlite3.Connection) -> None:
+    """Default backend: execute the scripts in the SQLite database itself."""
+    cur = con.cursor()
+    for fname in scripts(con):
+        fpath = os.path.join(SQL_DIR, fname)
+        print(f"Running: {fname}")
+        cur.executescript(read_sql(fpath))
+        con.commit()
+
+def duckdb_dialect(sql: str) -> str:
+    """
+    Shims for running the SQLite scripts on DuckDB. The scripts stick to
+    portable SQL, so only the BOM written by some editors needs stripping;
+    `substr`, `ROUND`, `COUNT(DISTINCT)` and `* 1.0 /` behave the same.
+    """
+    return sql.lstrip("\ufeff")
+
+DUCKDB_INT_TYPES = {"TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+                    "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT"}
+
+def fetch_duckdb(duck, name: str):
+    """
+    SELECT * from a DuckDB table, keeping integer columns integer. DuckDB's
+    SUM over integers is HUGEINT, which .df() turns into float64; narrowing to
+    BIGINT / nullable Int64 makes to_sql write INTEGER like SQLite does.
+    """
+    cols = duck.execute(f"DESCRIBE {name}").fetchall()
+    ints = [c for c, t, *_ in cols if t in DUCKDB_INT_TYPES]
+    select = ", ".join(f'CAST("{c}" AS BIGINT) AS "{c}"' if c in ints else f'"{c}"' for c, *_ in cols)
+    df = duck.execute(f"SELECT {select} FROM {name}").df()
+    for c in ints:
+        df[c] = df[c].astype("Int64")
+    return df
+
+def run_duckdb(con: sqlite3.Connection) -> None:
+    """
+    Vectorized backend: copy the base tables into an in-memory DuckDB
+    database, run the same scripts there and write the resulting KPI tables
+    back to SQLite. Views are still created in SQLite for Power BI.
+    """
+    try:
+        import duckdb
+    except ImportError as e:
+        raise SystemExit("The duckdb backend needs the duckdb package: pip install duckdb") from e
+    import pandas as pd
+
+    start = time.perf_counter()
+    duck = duckdb.connect()
+    try:
+        for name in base_tables(con):
+            df = pd.read_sql_query(f"SELECT * FROM {name}", con)
+            duck.register(f"{name}_df", df)
+            duck.execute(f"CREATE TABLE {name} AS SELECT * FROM {name}_df")
+            duck.unregister(f"{name}_df")
+        print(f"Loaded base tables into DuckDB in {time.perf_counter() - start:.2f}s")
+
+        for fname in scripts(con):
+            print(f"Running: {fname} (duckdb)")
+            duck.execute(duckdb_dialect(read_sql(os.path.join(SQL_DIR, fname))))
+
+        results = {name: fetch_duckdb(duck, name) for name in output_tables()}
+    finally:
+        duck.close()
+
+    con.executescript(read_sql(os.path.join(SQL_DIR, scripts(con)[0])))
+    for name, df in results.items():
+        df.to_sql(name, con, index=False, if_exists="replace")
+    con.commit()
+
+def run_approx(con: sqlite3.Connection, db_path: str) -> None:
+    """
+    Approximate mode: fold new fact rows into the persisted sketches and answer
+    kpi_monthly, kpi_by_region, kpi_by_channel and kpi_top_products from them.
+    The other KPI tables keep their last exact build; rerun without --approx
+    to go back to exact results.
+    """
+    import kpi_sketches
+
+    fname = scripts(con)[0]
+    print(f"Running: {fname}")
+    con.executescript(read_sql(os.path.join(SQL_DIR, fname)))
+
+    state = kpi_sketches.update(con, db_path, is_typed(con))
+    for name, df in kpi_sketches.approx_tables(con, state).items():
+        df.to_sql(name, con, index=False, if_exists="replace")
+    con.commit()
+
+    print("Approximate KPI tables: kpi_monthly, kpi_by_region, kpi_by_channel, kpi_top_products")
+    for line in kpi_sketches.error_bounds(state):
+        print(" -", line)
+
+BACKENDS = {
+    "sqlite": run_sqlite,
+    "duckdb": run_duckdb,
+}
+
+# -------------------------
+# Month partitions (typed storage)
+# -------------------------
+def parse_month_range(value: str) -> tuple[str, str]:
+    start, _, end = value.partition(":")
+    end = end or start
+    for m in (start, end):
+        if not re.fullmatch(r"\d{4}-\d{2}", m):
+            raise argparse.ArgumentTypeError(f"expected YYYY-MM or YYYY-MM:YYYY-MM, got {value!r}")
+    if start > end:
+        raise argparse.ArgumentTypeError(f"empty month range {value!r}")
+    return start, end
 
-    con = sqlite3.connect(DB_PATH)
+def user_version(path: str) -> int:
+    """Generation id generate_sales_db.py stamps into sales_ops.db and its month partitions."""
+    con = sqlite3.connect(path)
     try:
-        cur = con.cursor()
+        return con.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        con.close()
+
+def build_month_range_db(start: str, end: str) -> str:
+    """
+    Assemble a database for order months start..end (inclusive) from the
+    dimensions in sales_ops.db plus only the month partitions in range, so
+    KPI scripts never read the other months.
+
+    This is a materialising copy rather than a set of ATTACHed partitions:
+    the result must stay readable on its own (Power BI opens it directly)
+    and SQLite caps attached databases at 10 by default. The copy is reused
+    while it is newer than sales_ops.db and every selected partition and
+    carries the same generation id. Partitions from another generation are
+    refused: their surrogate keys do not match this build's dimensions.
+    """
+    if not os.path.isdir(MONTHS_DIR):
+        raise FileNotFoundError(f"No month partitions in {MONTHS_DIR}. Run generate_sales_db.py --storage typed --month-partitions")
+
+    months = sorted(m.group(1) for m in map(MONTH_PART_RE.match, os.listdir(MONTHS_DIR)) if m)
+    selected = [m for m in months if start <= m <= end]
+    if not selected:
+        raise SystemExit(f"No month partitions between {start} and {end} (have {months[0] if months else '-'}..{months[-1] if months else '-'})")
+
+    out = os.path.join(os.path.dirname(DB_PATH), f"sales_ops_{start}_{end}.db")
+    sources = [DB_PATH] + [os.path.join(MONTHS_DIR, f"sales_ops_{m}.db") for m in selected]
+    if os.path.exists(out):
+        if (os.path.getmtime(out) > max(os.path.getmtime(p) for p in sources)
+                and user_version(out) == user_version(DB_PATH)):
+            print(f"Reusing {out} ({len(selected)} of {len(months)} month partitions, {selected[0]}..{selected[-1]})")
+            return out
+        os.remove(out)
+
+    # Built under a temporary name so a failed build never looks like a reusable copy
+    tmp = out + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    con = sqlite3.connect(tmp)
+    try:
+        con.executescript(read_sql(os.path.join(SQL_DIR, TYPED_DIMS_SQL)))
+        con.executescript(read_sql(os.path.join(SQL_DIR, TYPED_FACTS_SQL)))
+
+        con.execute("ATTACH DATABASE ? AS core", (DB_PATH,))
+        if "order_key" not in {r[1] for r in con.execute("PRAGMA core.table_info(fact_orders)")}:
+            raise SystemExit(f"{DB_PATH} is not typed storage; regenerate with --storage typed")
+        generation = con.execute("PRAGMA core.user_version").fetchone()[0]
+        for name in ["dim_dates"] + DIM_TABLES:
+            con.execute(f"INSERT INTO {name} SELECT * FROM core.{name}")
+        con.commit()
+        con.execute("DETACH DATABASE core")
 
-        for fname in ORDER:
-            fpath = os.path.join(SQL_DIR, fname)
-            print(f"Running: {fname}")
-            cur.executescript(read_sql(fpath))
+        # One partition attached at a time keeps us under SQLite's attach limit
+        for m in selected:
+            con.execute("ATTACH DATABASE ? AS part", (os.path.join(MONTHS_DIR, f"sales_ops_{m}.db"),))
+            if con.execute("PRAGMA part.user_version").fetchone()[0] != generation:
+                raise SystemExit(f"Month partition {m} was not built with the current {os.path.basename(DB_PATH)}; "
+                                 "regenerate with --storage typed --month-partitions")
+            for name in FACT_TABLES:
+                con.execute(f"INSERT INTO {name} SELECT * FROM part.{name}")
             con.commit()
+            con.execute("DETACH DATABASE part")
+        con.execute(f"PRAGMA user_version = {generation}")
+        con.commit()
+    except BaseException:
+        con.close()
+        os.remove(tmp)
+        raise
+    con.close()
+    os.replace(tmp, out)
+
+    print(f"Copied {len(selected)} of {len(months)} month partitions ({selected[0]}..{selected[-1]}) → {out}")
+    return out
+
+# -------------------------
+# Cross-check
+# -------------------------
+def snapshot(con: sqlite3.Connection) -> dict:
+    import pandas as pd
+    return {name: pd.read_sql_query(f"SELECT * FROM {name}", con) for name in output_tables()}
+
+def diff_tables(expected: dict, actual: dict) -> list[str]:
+    """
+    Order-insensitive comparison of KPI tables. Column dtype kinds must match;
+    integer and text columns are compared exactly, floats with a tolerance.
+    """
+    import numpy as np
+    import pandas as pd
+
+    problems: list[str] = []
+    for name, exp in expected.items():
+        act = actual.get(name)
+        if act is None:
+            problems.append(f"{name}: missing")
+            continue
+        if list(exp.columns) != list(act.columns):
+            problems.append(f"{name}: columns {list(act.columns)} != {list(exp.columns)}")
+            continue
+        if len(exp) != len(act):
+            problems.append(f"{name}: {len(act)} rows != {len(exp)}")
+            continue
+
+        keys = [c for c in exp.columns if not pd.api.types.is_float_dtype(exp[c])]
+        exp = exp.sort_values(keys or list(exp.columns)).reset_index(drop=True)
+        act = act.sort_values(keys or list(act.columns)).reset_index(drop=True)
+        for c in exp.columns:
+            a, b = exp[c], act[c]
+            if a.dtype.kind != b.dtype.kind:
+                problems.append(f"{name}.{c}: dtype {b.dtype} != {a.dtype}")
+                continue
+            if pd.api.types.is_float_dtype(a):
+                ok = np.isclose(a, b, rtol=REL_TOL, atol=ABS_TOL, equal_nan=True)
+            elif pd.api.types.is_numeric_dtype(a):
+                ok = (a == b).to_numpy()
+            else:
+                ok = (a.astype(str) == b.astype(str)).to_numpy()
+            if not ok.all():
+                problems.append(f"{name}.{c}: {int((~ok).sum())} value(s) differ")
+    return problems
+
+def timed(fn, con: sqlite3.Connection) -> float:
+    start = time.perf_counter()
+    fn(con)
+    return time.perf_counter() - start
+
+def compare(con: sqlite3.Connection, backend: str) -> bool:
+    """Run SQLite and `backend` on the same data, report timings and check results match."""
+    t_sqlite = timed(run_sqlite, con)
+    expected = snapshot(con)
+    t_other = timed(BACKENDS[backend], con)
+    actual = snapshot(con)
+
+    # Leave the reference SQLite results in place
+    run_sqlite(con)
+
+    rows = con.execute("SELECT COUNT(*) FROM fact_order_items").fetchone()[0]
+    print(f"\nTiming on {rows:,} order items:")
+    print(f"  {'sqlite':<8} {t_sqlite:8.2f}s")
+    print(f"  {backend:<8} {t_other:8.2f}s  ({t_sqlite / max(t_other, 1e-9):.1f}x)")
+
+    problems = diff_tables(expected, actual)
+    if problems:
+        print(f"\n❌ {backend} results differ from sqlite:")
+        for p in problems:
+            print(" -", p)
+        return False
+    print(f"\n✅ {backend} results match sqlite ({len(expected)} tables)")
+    return True
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the sales-ops views and KPI tables.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="sqlite",
+                        help="engine that executes the KPI scripts (default: sqlite)")
+    parser.add_argument("--compare", action="store_true",
+                        help="run sqlite and --backend side by side, print timings and cross-check results")
+    parser.add_argument("--months", type=parse_month_range, metavar="YYYY-MM[:YYYY-MM]",
+                        help="build KPIs for an order-month range from the per-month partitions "
+                             "into data/sales_ops_<start>_<end>.db (typed storage)")
+    parser.add_argument("--approx", action="store_true",
+                        help="answer the top-product and distinct-count KPIs from incrementally updated "
+                             "sketches (see kpi_sketches.py); omit for exact results")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+
+    if not os.path.exists(DB_PATH):
+        raise FileNotFoundError(f"Database not found: {DB_PATH}")
+
+    db_path = build_month_range_db(*args.months) if args.months else DB_PATH
+
+    con = sqlite3.connect(db_path)
+    try:
+        if args.approx:
+            if args.compare or args.backend != "sqlite":
+                raise SystemExit("--approx cannot be combined with --compare or --backend")
+            run_approx(con, db_path)
+        elif args.compare:
+            if args.backend == "sqlite":
+                raise SystemExit("--compare needs a non-default --backend, e.g. --backend duckdb")
+            if not compare(con, args.backend):
+                raise SystemExit(1)
+        else:
+            BACKENDS[args.backend](con)
 
         print("\n✅ KPI tables created successfully.\n")
 
-        rows = cur.execute("""
+        rows = con.execute("""
             SELECT name
             FROM sqlite_master
             WHERE type IN ('table','view')
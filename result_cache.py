@@ -0,0 +1,200 @@
+﻿from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+ROOT_DIR = os.path.abspath(os.path.dirname(__file__))
+CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", os.path.join(ROOT_DIR, ".result_cache"))
+MAX_BYTES = int(float(os.environ.get("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+CACHE_FORMAT = 1
+
+# Sampled input digest: files up to FULL_DIGEST_BYTES are hashed completely,
+# larger ones by head, tail and SAMPLE_BLOCKS evenly spaced blocks.
+FULL_DIGEST_BYTES = 8 * 1024 * 1024
+SAMPLE_BLOCKS = 16
+BLOCK_BYTES = 64 * 1024
+
+MANIFEST = "manifest.json"
+
+def file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def sampled_digest(path: str) -> str:
+    size = os.path.getsize(path)
+    if size <= FULL_DIGEST_BYTES:
+        return file_digest(path)
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        step = (size - BLOCK_BYTES) // (SAMPLE_BLOCKS + 1)
+        for offset in [0, *(step * i for i in range(1, SAMPLE_BLOCKS + 1)), size - BLOCK_BYTES]:
+            f.seek(offset)
+            h.update(f.read(BLOCK_BYTES))
+    return "sampled:" + h.hexdigest()
+
+def input_fingerprint(path: str) -> dict:
+    """Cheap identity of an input file: size, mtime and a sampled content digest."""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "digest": sampled_digest(path)}
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class ResultCache:
+    """
+    Content-addressed cache for one pipeline stage's output files.
+
+    The key combines the stage name, a fingerprint of every input file, the
+    stage parameters and the hash of the stage's source files, so editing the
+    code, the rule sets or the data all miss. Entries are evicted least
+    recently used first once the cache grows past MAX_BYTES.
+    """
+
+    def __init__(self, stage: str, inputs: list[str], outputs: list[str], params: dict, code_files: list[str]) -> None:
+        self.stage = stage
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params
+        self.code_files = code_files
+        self.key = self._key()
+        self.entry_dir = os.path.join(CACHE_DIR, stage, self.key)
+
+    def _key(self) -> str:
+        spec = {
+            "format": CACHE_FORMAT,
+            "stage": self.stage,
+            "inputs": [input_fingerprint(p) for p in self.inputs],
+            "params": self.params,
+            "code": [file_digest(p) for p in self.code_files],
+            "outputs": [os.path.basename(p) for p in self.outputs],
+        }
+        blob = json.dumps(spec, sort_keys=True, default=repr).encode("utf-8")
+        return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+    def _manifest(self) -> dict | None:
+        try:
+            with open(os.path.join(self.entry_dir, MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _touch(self, manifest: dict) -> None:
+        manifest["last_used"] = time.time()
+        tmp = os.path.join(self.entry_dir, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, os.path.join(self.entry_dir, MANIFEST))
+
+    def restore(self) -> bool:
+        """Copy the cached outputs into place. Returns False on a miss or a damaged entry."""
+        manifest = self._manifest()
+        if manifest is None:
+            return False
+        stored = manifest["outputs"]
+        for dest in self.outputs:
+            name = os.path.basename(dest)
+            src = os.path.join(self.entry_dir, name)
+            if name not in stored or not os.path.exists(src) or os.path.getsize(src) != stored[name]["size"]:
+                shutil.rmtree(self.entry_dir, ignore_errors=True)
+                return False
+        for dest in self.outputs:
+            src = os.path.join(self.entry_dir, os.path.basename(dest))
+            tmp = dest + ".restore.tmp"
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dest)
+        self._touch(manifest)
+        return True
+
+    def store(self) -> None:
+        """Save the freshly written outputs under this key, then enforce the size bound."""
+        os.makedirs(os.path.join(CACHE_DIR, self.stage), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging_", dir=os.path.join(CACHE_DIR, self.stage))
+        try:
+            outputs = {}
+            for src in self.outputs:
+                name = os.path.basename(src)
+                shutil.copyfile(src, os.path.join(staging, name))
+                outputs[name] = {"size": os.path.getsize(src), "digest": file_digest(src)}
+            manifest = {
+                "stage": self.stage,
+                "key": self.key,
+                "created": time.time(),
+                "last_used": time.time(),
+                "params": self.params,
+                "inputs": {p: file_digest(p) for p in self.inputs},
+                "outputs": outputs,
+            }
+            with open(os.path.join(staging, MANIFEST), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2, default=repr)
+            shutil.rmtree(self.entry_dir, ignore_errors=True)
+            os.replace(staging, self.entry_dir)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        evict(MAX_BYTES)
+
+    def verify(self) -> list[str]:
+        """
+        Compare a fresh run's outputs (already written) with the cached entry for
+        the same key. Also catches sampled-digest collisions by checking the
+        full input digests recorded at store time. A missing entry is reported
+        too: there is nothing to verify against.
+        """
+        manifest = self._manifest()
+        if manifest is None:
+            return [f"no cached entry for {self.stage} key {self.key} to verify against "
+                    "(inputs, parameters or code changed since the last run, or it was evicted)"]
+        problems = []
+        for p in self.inputs:
+            if manifest["inputs"].get(p) != file_digest(p):
+                problems.append(f"input {os.path.basename(p)} changed without changing its fingerprint")
+        for dest in self.outputs:
+            name = os.path.basename(dest)
+            cached = manifest["outputs"].get(name)
+            if cached is None or cached["digest"] != file_digest(dest):
+                problems.append(f"output {name} differs from the cached copy")
+        return problems
+
+def evict(max_bytes: int = MAX_BYTES) -> int:
+    """Drop least recently used entries until the cache fits in max_bytes. Returns entries removed."""
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+    entries = []
+    for stage in os.listdir(CACHE_DIR):
+        stage_dir = os.path.join(CACHE_DIR, stage)
+        if not os.path.isdir(stage_dir):
+            continue
+        for key in os.listdir(stage_dir):
+            entry_dir = os.path.join(stage_dir, key)
+            if key.startswith(".staging_") or not os.path.isdir(entry_dir):
+                continue
+            try:
+                with open(os.path.join(entry_dir, MANIFEST), "r", encoding="utf-8") as f:
+                    last_used = float(json.load(f).get("last_used", 0))
+            except (OSError, ValueError):
+                last_used = 0.0
+            entries.append((last_used, entry_dir, _dir_size(entry_dir)))
+
+    total = sum(size for _, _, size in entries)
+    removed = 0
+    for _, entry_dir, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,248 @@
+﻿from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date
+
+ROOT_DIR = os.path.abspath(os.path.dirname(__file__))
+STATE_PATH = os.path.join(ROOT_DIR, ".pipeline_state.json")
+
+BPA_DIR = os.path.join(ROOT_DIR, "01-business-process-analyzer")
+DQ_DIR = os.path.join(ROOT_DIR, "02-data-quality-governance")
+SALES_DIR = os.path.join(ROOT_DIR, "03-sales-ops-sql-dashboard")
+
+@dataclass
+class Task:
+    name: str
+    project_dir: str
+    script: str
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)
+    deps: list[str] = field(default_factory=list)
+    args: list[str] = field(default_factory=list)
+    # Output depends on the wall clock (generators use rolling windows from today)
+    daily: bool = False
+
+    def path(self, rel: str) -> str:
+        return os.path.join(self.project_dir, rel)
+
+# Three independent chains: generate -> analyze, generate -> checks, generate -> SQL build.
+TASKS = [
+    Task("bpa.generate", BPA_DIR, "src/generate_data.py", daily=True,
+         outputs=["data/tickets_raw.csv"]),
+    Task("bpa.analyze", BPA_DIR, "src/analyze.py",
+         inputs=["data/tickets_raw.csv"],
+         outputs=["data/tickets_clean.csv", "data/tickets_rejected.csv", "data/kpi_overall.csv",
+                  "data/kpi_by_priority.csv", "data/kpi_by_category.csv", "data/kpi_by_owner.csv",
+                  "data/kpi_bottlenecks.csv"],
+         deps=["bpa.generate"]),
+    Task("dq.generate", DQ_DIR, "src/generate_data.py", daily=True,
+         outputs=["data/raw_customers.csv", "data/raw_transactions.csv"]),
+    Task("dq.checks", DQ_DIR, "src/data_quality_checks.py",
+         inputs=["data/raw_customers.csv", "data/raw_transactions.csv"],
+         outputs=["data/dq_issues.csv", "data/dq_summary.csv"],
+         deps=["dq.generate"]),
+    Task("sales.generate", SALES_DIR, "src/generate_sales_db.py", daily=True,
+         inputs=["sql/01_schema_typed_dims.sql", "sql/02_schema_typed_facts.sql"],
+         outputs=["data/sales_ops.db"]),
+    Task("sales.sql", SALES_DIR, "src/run_sql.py",
+         inputs=["data/sales_ops.db", "sql/01_schema_typed_dims.sql", "sql/02_schema_typed_facts.sql",
+                 "sql/10_views_core.sql", "sql/10_views_core_typed.sql",
+                 "sql/20_kpi_tables.sql", "sql/30_customer_cohorts.sql"],
+         outputs=["data/sales_ops.db"],
+         deps=["sales.generate"]),
+]
+
+def file_digest(path: str) -> str | None:
+    if not os.path.exists(path):
+        return None
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def task_key(task: Task) -> dict:
+    """Content hashes of everything a task's result depends on: its script, args and inputs."""
+    key = {"script": file_digest(task.path(task.script)), "args": list(task.args)}
+    if task.daily:
+        key["run_date"] = date.today().isoformat()
+    for rel in task.inputs:
+        key[rel] = file_digest(task.path(rel))
+    return key
+
+def outputs_key(task: Task) -> dict:
+    return {rel: file_digest(task.path(rel)) for rel in task.outputs}
+
+def load_state() -> dict:
+    if not os.path.exists(STATE_PATH):
+        return {}
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state: dict) -> None:
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, STATE_PATH)
+
+def is_up_to_date(task: Task, state: dict) -> bool:
+    """
+    A task is skipped when its script/inputs hash the same as after its last
+    successful run and its outputs are still the files it produced. Keys are
+    recorded after the run, so tasks that rewrite an input in place (run_sql.py
+    on sales_ops.db) do not look changed on the next run.
+    """
+    prev = state.get(task.name)
+    if not prev:
+        return False
+    outputs = outputs_key(task)
+    if any(v is None for v in outputs.values()):
+        return False
+    return prev.get("key") == task_key(task) and prev.get("outputs") == outputs
+
+def refresh_upstream_outputs(task: Task, by_name: dict[str, Task], state: dict) -> None:
+    """Re-record files that `task` rewrote in place so their producer is not seen as stale."""
+    written = {os.path.normpath(task.path(rel)) for rel in task.outputs}
+    for name, entry in state.items():
+        other = by_name.get(name)
+        if other is None or other is task:
+            continue
+        for rel in other.outputs:
+            if os.path.normpath(other.path(rel)) in written and rel in entry.get("outputs", {}):
+                entry["outputs"][rel] = file_digest(other.path(rel))
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+async def run_task(task: Task, sem: asyncio.Semaphore) -> tuple[int, float]:
+    env = dict(os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8")
+    async with sem:
+        start = time.perf_counter()
+        log(f"[start] {task.name}: python {task.script} {' '.join(task.args)}".rstrip())
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, task.script, *task.args,
+            cwd=task.project_dir,
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        assert proc.stdout is not None
+        async for line in proc.stdout:
+            log(f"  {task.name} | {line.decode('utf-8', errors='replace').rstrip()}")
+        code = await proc.wait()
+        return code, time.perf_counter() - start
+
+async def run_pipeline(tasks: list[Task], jobs: int, force: set[str] | None, dry_run: bool) -> int:
+    by_name = {t.name: t for t in tasks}
+    for t in tasks:
+        missing = [d for d in t.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"{t.name} depends on unknown task(s): {', '.join(missing)}")
+
+    state = load_state()
+    sem = asyncio.Semaphore(max(jobs, 1))
+    done: dict[str, asyncio.Future] = {t.name: asyncio.get_running_loop().create_future() for t in tasks}
+    results: dict[str, tuple[str, float]] = {}
+
+    async def worker(task: Task) -> None:
+        dep_status = [await done[d] for d in task.deps]
+        if any(s == "failed" for s in dep_status):
+            results[task.name] = ("blocked", 0.0)
+            log(f"[blocked] {task.name}: upstream task failed")
+            done[task.name].set_result("failed")
+            return
+
+        # Downstream tasks are re-checked against the fresh upstream outputs; only a
+        # dry run has to assume an upstream rerun changes them.
+        upstream_pending = dry_run and any(s == "ran" for s in dep_status)
+        forced = force is not None and (not force or task.name in force)
+        if not forced and not upstream_pending and is_up_to_date(task, state):
+            results[task.name] = ("cached", 0.0)
+            log(f"[cached] {task.name}: inputs unchanged")
+            done[task.name].set_result("cached")
+            return
+
+        if dry_run:
+            results[task.name] = ("would run", 0.0)
+            log(f"[would run] {task.name}")
+            done[task.name].set_result("ran")
+            return
+
+        code, elapsed = await run_task(task, sem)
+        if code != 0:
+            results[task.name] = ("failed", elapsed)
+            log(f"[failed] {task.name}: exit code {code} after {elapsed:.1f}s")
+            state.pop(task.name, None)
+            done[task.name].set_result("failed")
+            return
+
+        state[task.name] = {"key": task_key(task), "outputs": outputs_key(task)}
+        refresh_upstream_outputs(task, by_name, state)
+        save_state(state)
+        results[task.name] = ("ran", elapsed)
+        log(f"[done] {task.name} in {elapsed:.1f}s")
+        done[task.name].set_result("ran")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(t) for t in tasks))
+    wall = time.perf_counter() - start
+
+    log("\nSummary:")
+    for t in tasks:
+        status, elapsed = results[t.name]
+        log(f"  {t.name:<16} {status:<10} {elapsed:6.1f}s")
+    log(f"Wall time: {wall:.1f}s")
+
+    return 1 if any(s in ("failed", "blocked") for s, _ in results.values()) else 0
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run all portfolio pipelines as a task DAG.")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="maximum number of tasks running at once")
+    parser.add_argument("--force", nargs="*", metavar="TASK",
+                        help="rerun the given tasks (or every task if none given) even if inputs are unchanged")
+    parser.add_argument("--only", nargs="+", metavar="TASK",
+                        help="run only these tasks and their upstream dependencies")
+    parser.add_argument("--dry-run", action="store_true", help="show what would run without running it")
+    parser.add_argument("--list", action="store_true", help="list tasks and exit")
+    return parser.parse_args(argv)
+
+def select_tasks(names: list[str]) -> list[Task]:
+    by_name = {t.name: t for t in TASKS}
+    unknown = [n for n in names if n not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown task(s): {', '.join(unknown)}")
+    wanted: set[str] = set()
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name not in wanted:
+            wanted.add(name)
+            stack.extend(by_name[name].deps)
+    return [t for t in TASKS if t.name in wanted]
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+
+    if args.list:
+        for t in TASKS:
+            deps = f" (after {', '.join(t.deps)})" if t.deps else ""
+            print(f"{t.name:<16} {os.path.relpath(t.path(t.script), ROOT_DIR)}{deps}")
+        return
+
+    tasks = select_tasks(args.only) if args.only else TASKS
+    force = set(args.force) if args.force is not None else None
+    sys.exit(asyncio.run(run_pipeline(tasks, args.jobs, force, args.dry_run)))
+
+if __name__ == "__main__":
+    main()